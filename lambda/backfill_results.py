@@ -0,0 +1,322 @@
+"""
+Re-apply the current threat filters to historical results.
+
+Walks threat-results/YYYY/MM/DD/ partitions, either in a local mirror or in
+the results bucket, and pushes every stored result through the same filter
+functions the results processor Lambda uses. Files are evaluated in a process
+pool, progress is checkpointed so an interrupted run picks up where it left
+off, and a diff report with throughput stats is written at the end.
+
+The filters need numpy (pip install -r lambda/requirements.txt); boto3 is
+only imported for s3:// sources, so a local mirror can be processed offline.
+
+Usage:
+    python backfill_results.py ./mirror/threat-results --report backfill-report.json
+    python backfill_results.py s3://my-results-bucket/threat-results/2024/05
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from threat_filters import (
+    THREAT_LABELS,
+    evaluate_rekognition_response,
+    get_crowd_size,
+    get_min_confidence,
+    reevaluate_threats
+)
+
+# Raw Get* responses mirrored locally, keyed by the field holding detections
+RAW_RESPONSE_APIS = {
+    'Labels': 'StartLabelDetection',
+    'ModerationLabels': 'StartContentModeration',
+    'Persons': 'StartPersonTracking'
+}
+
+def parse_s3_uri(uri):
+    """Split s3://bucket/prefix into (bucket, prefix)"""
+    bucket, _, prefix = uri[len('s3://'):].partition('/')
+    return bucket, prefix
+
+def list_result_keys(source):
+    """List every result document under a local directory or s3:// prefix"""
+    if source.startswith('s3://'):
+        import boto3
+
+        bucket, prefix = parse_s3_uri(source)
+        paginator = boto3.client('s3').get_paginator('list_objects_v2')
+        keys = []
+
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.json'):
+                    keys.append(f"s3://{bucket}/{obj['Key']}")
+
+        return sorted(keys)
+
+    keys = []
+
+    for root, _, files in os.walk(source):
+        for name in files:
+            if name.endswith('.json'):
+                keys.append(os.path.join(root, name))
+
+    return sorted(keys)
+
+def load_document(key):
+    """Read a result document from disk or S3"""
+    if key.startswith('s3://'):
+        import boto3
+
+        bucket, object_key = parse_s3_uri(key)
+        response = boto3.client('s3').get_object(Bucket=bucket, Key=object_key)
+        return json.loads(response['Body'].read())
+
+    with open(key) as f:
+        return json.load(f)
+
+def infer_api(key, document):
+    """Work out which Rekognition API produced a document"""
+    if document.get('api'):
+        return document['api']
+
+    # save_threat_results names objects <job_id>-<api>.json
+    name = os.path.basename(key)[:-len('.json')]
+    for api in RAW_RESPONSE_APIS.values():
+        if name.endswith(f"-{api}"):
+            return api
+
+    for field, api in RAW_RESPONSE_APIS.items():
+        if field in document:
+            return api
+
+    return None
+
+def threat_key(threat):
+    """Identity of a threat for diffing before/after sets"""
+    return (threat.get('type'), threat.get('label'), threat.get('timestamp'))
+
+def reprocess_document(key, min_confidence, crowd_size):
+    """Re-evaluate a single result document; runs inside a worker process"""
+    document = load_document(key)
+    api = infer_api(key, document)
+
+    before = document.get('threats_detected', [])
+
+    if any(field in document for field in RAW_RESPONSE_APIS):
+        after = evaluate_rekognition_response(api, document, min_confidence, crowd_size)
+    else:
+        after = reevaluate_threats(api, before, min_confidence, crowd_size)
+
+    before_keys = {threat_key(t) for t in before}
+    after_keys = {threat_key(t) for t in after}
+
+    return {
+        'key': key,
+        'job_id': document.get('job_id'),
+        'api': api,
+        'before_count': len(before),
+        'after_count': len(after),
+        'removed': [t for t in before if threat_key(t) not in after_keys],
+        'added': [t for t in after if threat_key(t) not in before_keys],
+        'threats': after
+    }
+
+def load_checkpoint(checkpoint_path):
+    """
+    Load a previous run's checkpoint file.
+
+    The first line records the filter settings the run used; every other line
+    is one finished entry. Returns (settings, entries), with settings None
+    when the file is missing or has no header.
+    """
+    settings = None
+    entries = {}
+
+    if not os.path.exists(checkpoint_path):
+        return settings, entries
+
+    with open(checkpoint_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Partial line from an interrupted write
+                continue
+            if 'settings' in entry:
+                settings = entry['settings']
+            else:
+                entries[entry['key']] = entry
+
+    return settings, entries
+
+def open_checkpoint(checkpoint_path, settings, restart=False):
+    """
+    Open the checkpoint for appending and return (file, finished entries).
+
+    Entries computed with other settings can't be reused, so a mismatch is
+    refused unless restart is set, in which case the checkpoint starts over.
+    """
+    saved_settings, entries = load_checkpoint(checkpoint_path)
+
+    if entries and saved_settings != settings:
+        if not restart:
+            raise ValueError(
+                f"Checkpoint {checkpoint_path} was written with settings {saved_settings}, "
+                f"not {settings}; use --restart or a different --checkpoint"
+            )
+        print(f"Settings changed, discarding {len(entries)} checkpointed results")
+        entries = {}
+
+    if entries:
+        return open(checkpoint_path, 'a'), entries
+
+    checkpoint = open(checkpoint_path, 'w')
+    checkpoint.write(json.dumps({'settings': settings}) + '\n')
+    checkpoint.flush()
+    return checkpoint, entries
+
+def write_result(entry, output_dir, source):
+    """Write a re-evaluated result next to its original partition layout"""
+    relative = entry['key']
+    if relative.startswith('s3://'):
+        relative = parse_s3_uri(relative)[1]
+    elif not source.startswith('s3://'):
+        relative = os.path.relpath(relative, source)
+
+    path = os.path.join(output_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'w') as f:
+        json.dump({
+            'job_id': entry['job_id'],
+            'api': entry['api'],
+            'timestamp': datetime.utcnow().isoformat(),
+            'threats_detected': entry['threats'],
+            'threat_count': len(entry['threats']),
+            'reprocessed_from': entry['key']
+        }, f, indent=2)
+
+def run_backfill(source, checkpoint_path, workers=None, output_dir=None,
+                 min_confidence=None, crowd_size=None, restart=False):
+    """Reprocess every document under source and return the diff report"""
+    if min_confidence is None:
+        min_confidence = get_min_confidence()
+    if crowd_size is None:
+        crowd_size = get_crowd_size()
+
+    settings = {
+        'min_confidence': min_confidence,
+        'crowd_size': crowd_size,
+        'threat_labels': THREAT_LABELS
+    }
+
+    started = time.time()
+    keys = list_result_keys(source)
+    checkpoint, done = open_checkpoint(checkpoint_path, settings, restart)
+    pending = [key for key in keys if key not in done]
+
+    print(f"Found {len(keys)} result files, {len(done)} already checkpointed, {len(pending)} to process")
+
+    errors = []
+    threats_processed = 0
+
+    with checkpoint, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(reprocess_document, key, min_confidence, crowd_size): key
+            for key in pending
+        }
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"Error reprocessing {key}: {str(e)}")
+                errors.append({'key': key, 'error': str(e)})
+                continue
+
+            if output_dir:
+                write_result(entry, output_dir, source)
+
+            # Drop the full threat list once written; the diff is what we keep
+            entry.pop('threats')
+            checkpoint.write(json.dumps(entry) + '\n')
+            checkpoint.flush()
+            done[key] = entry
+            threats_processed += entry['before_count']
+
+    elapsed = time.time() - started
+    entries = [done[key] for key in keys if key in done]
+    changed = [e for e in entries if e['removed'] or e['added']]
+
+    return {
+        'source': source,
+        'settings': settings,
+        'summary': {
+            'files_total': len(keys),
+            'files_processed': len(pending) - len(errors),
+            'files_resumed': len(keys) - len(pending),
+            'files_changed': len(changed),
+            'files_failed': len(errors),
+            'threats_before': sum(e['before_count'] for e in entries),
+            'threats_after': sum(e['after_count'] for e in entries),
+            'threats_removed': sum(len(e['removed']) for e in entries),
+            'threats_added': sum(len(e['added']) for e in entries)
+        },
+        'throughput': {
+            'elapsed_seconds': round(elapsed, 3),
+            'files_per_second': round((len(pending) - len(errors)) / elapsed, 2) if elapsed else 0.0,
+            'threats_per_second': round(threats_processed / elapsed, 2) if elapsed else 0.0
+        },
+        'changes': changed,
+        'errors': errors
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-apply current threat filters to stored results')
+    parser.add_argument('source', help='Local threat-results/ mirror or s3://bucket/prefix')
+    parser.add_argument('--checkpoint', default='backfill-checkpoint.jsonl',
+                        help='Checkpoint file; rerun with the same path to resume')
+    parser.add_argument('--report', default='backfill-report.json', help='Where to write the diff report')
+    parser.add_argument('--output-dir', help='Write re-evaluated results here, mirroring the source layout')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--min-confidence', type=float, help='Override MIN_CONFIDENCE')
+    parser.add_argument('--crowd-size', type=int, help='Override CROWD_SIZE_THRESHOLD')
+    parser.add_argument('--restart', action='store_true',
+                        help='Discard a checkpoint written with different settings instead of refusing')
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_backfill(
+            args.source,
+            args.checkpoint,
+            workers=args.workers,
+            output_dir=args.output_dir,
+            min_confidence=args.min_confidence,
+            crowd_size=args.crowd_size,
+            restart=args.restart
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    summary = report['summary']
+    throughput = report['throughput']
+    print(f"Reprocessed {summary['files_processed']} files ({summary['files_resumed']} resumed) "
+          f"in {throughput['elapsed_seconds']}s - {throughput['files_per_second']} files/s")
+    print(f"Threats {summary['threats_before']} -> {summary['threats_after']} "
+          f"({summary['files_changed']} files changed, {summary['files_failed']} failed)")
+    print(f"Report written to {args.report}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import numpy as np
+
+def as_timestamp(value):
+    return -1 if value is None else value
+
+class LabelTable:
+    """Interns label names to small integer IDs and tracks which IDs are threats"""
+
+    def __init__(self, threat_labels):
+        self.threat_labels = set(threat_labels)
+        self.ids = {}
+        self.names = []
+        self.is_threat = []
+
+    def intern(self, name):
+        label_id = self.ids.get(name)
+
+        if label_id is None:
+            label_id = len(self.names)
+            self.ids[name] = label_id
+            self.names.append(name)
+            self.is_threat.append(name in self.threat_labels)
+
+        return label_id
+
+    def threat_mask(self):
+        """Boolean array indexed by label ID"""
+        return np.array(self.is_threat, dtype=bool)
+
+class DetectionBatch:
+    """
+    Column arrays for one page of Rekognition detections.
+
+    Only label ID, confidence and timestamp are decoded; the raw detections
+    are kept by reference so dicts are built just for rows that survive.
+    """
+
+    def __init__(self, detections, label_ids, confidence, timestamp):
+        self.detections = detections
+        self.label_ids = label_ids
+        self.confidence = confidence
+        self.timestamp = timestamp
+
+    @classmethod
+    def decode(cls, detections, field, table):
+        """Decode detections whose label lives under field ('Label' or 'ModerationLabel')"""
+        count = len(detections)
+        labels = [detection.get(field, {}) for detection in detections]
+        intern = table.intern
+
+        return cls(
+            detections,
+            np.fromiter((intern(label.get('Name')) for label in labels), dtype=np.int32, count=count),
+            np.fromiter((label.get('Confidence') or 0 for label in labels), dtype=np.float64, count=count),
+            # Stored threats may carry a null timestamp; -1 marks it missing
+            np.fromiter((as_timestamp(detection.get('Timestamp')) for detection in detections), dtype=np.float64, count=count)
+        )
+
+    def __len__(self):
+        return len(self.detections)
+
+    def confidence_mask(self, min_confidence):
+        return self.confidence >= min_confidence
+
+    def threat_mask(self, table, min_confidence):
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        return table.threat_mask()[self.label_ids] & self.confidence_mask(min_confidence)
+
+    def label_counts(self, table, mask, counts=None):
+        """Add per-label counts of the masked rows into counts"""
+        if counts is None:
+            counts = {}
+
+        tally = np.bincount(self.label_ids[mask], minlength=len(table.names))
+        for label_id in np.flatnonzero(tally):
+            name = table.names[label_id]
+            counts[name] = counts.get(name, 0) + int(tally[label_id])
+
+        return counts
+
+    def surviving(self, mask):
+        """Raw detections for the rows selected by mask, in their original order"""
+        return [self.detections[i] for i in np.flatnonzero(mask)]
@@ -3,155 +3,303 @@ import boto3
 import os
 from datetime import datetime
 
+from threat_filters import (
+    count_persons_by_timestamp,
+    detect_crowds,
+    filter_label_detections,
+    filter_moderation_detections,
+    get_min_confidence
+)
+
 rekognition = boto3.client('rekognition')
 s3 = boto3.client('s3')
 sns = boto3.client('sns')
+sqs = boto3.client('sqs')
 cloudwatch = boto3.client('cloudwatch')
 
-# Threat detection labels
-THREAT_LABELS = [
-    'Weapon', 'Gun', 'Knife', 'Rifle', 'Handgun', 'Pistol',
-    'Fire', 'Smoke', 'Explosion', 'Violence', 'Fighting',
-    'Crowd', 'Protest', 'Riot', 'Suspicious Activity'
-]
+# Stop paging and checkpoint once fewer than this many ms remain
+DEFAULT_CHECKPOINT_MARGIN_MS = 30000
+
+# Consecutive failed pages before the record is reported as a batch item failure
+DEFAULT_PAGE_RETRY_LIMIT = 5
 
 def lambda_handler(event, context):
     """
     Process Rekognition job completion notifications and analyze results for threats
+    
+    Each record is processed on its own. A failing record is reported in
+    batchItemFailures so SQS only redelivers that record, and moves it to the
+    dead-letter queue once maxReceiveCount is reached.
     """
     
-    try:
-        for record in event['Records']:
-            # Parse SQS message from SNS
-            message_body = json.loads(record['body'])
-            sns_message = json.loads(message_body['Message'])
+    batch_item_failures = []
+    
+    for record in event['Records']:
+        try:
+            process_record(record, context)
+        except Exception as e:
+            print(f"Error processing record {record['messageId']}: {str(e)}")
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
+    
+    return {'batchItemFailures': batch_item_failures}
+
+def process_record(record, context):
+    """Process one SQS record; raises so only this record is retried"""
+    # Parse SQS message from SNS
+    message_body = json.loads(record['body'])
+    sns_message = json.loads(message_body['Message'])
+    
+    job_id = sns_message['JobId']
+    job_status = sns_message['Status']
+    api = sns_message['API']
+    
+    # Not enough time left to make progress, hand the record to a fresh invocation
+    if deadline_reached(context):
+        print(f"Deadline close, re-enqueueing {api} job {job_id} untouched")
+        enqueue_continuation(sns_message)
+        return
+    
+    print(f"Processing {api} job {job_id} with status {job_status}")
+    
+    if job_status == 'SUCCEEDED':
+        threats_detected = []
+        label_counts = {}
+        pending = None
+        checkpoint = None
+        
+        if sns_message.get('Checkpoint'):
+            checkpoint = load_checkpoint(sns_message['Checkpoint'])
             
-            job_id = sns_message['JobId']
-            job_status = sns_message['Status']
-            api = sns_message['API']
+            # SQS delivers at least once; another copy of this continuation already finished the job
+            if checkpoint is None:
+                print(f"Checkpoint {sns_message['Checkpoint']} is gone, {api} job {job_id} was already finalized")
+                return
             
-            print(f"Processing {api} job {job_id} with status {job_status}")
+            print(f"Resuming {api} job {job_id} from {sns_message['Checkpoint']}")
+        
+        if api == 'StartLabelDetection':
+            threats, pending = process_label_detection(job_id, context, checkpoint, label_counts)
+            threats_detected.extend(threats)
+        elif api == 'StartContentModeration':
+            threats, pending = process_content_moderation(job_id, context, checkpoint, label_counts)
+            threats_detected.extend(threats)
+        elif api == 'StartPersonTracking':
+            threats, pending = process_person_tracking(job_id, context, checkpoint)
+            threats_detected.extend(threats)
+        
+        # Ran out of time or hit a page error part way through, continue in the next invocation
+        if pending:
+            delay_seconds = 0
             
-            if job_status == 'SUCCEEDED':
-                threats_detected = []
-                
-                if api == 'StartLabelDetection':
-                    threats_detected.extend(process_label_detection(job_id))
-                elif api == 'StartContentModeration':
-                    threats_detected.extend(process_content_moderation(job_id))
-                elif api == 'StartPersonTracking':
-                    threats_detected.extend(process_person_tracking(job_id))
+            if pending.get('error'):
+                failures = (checkpoint or {}).get('failures', 0) + 1
+                retry_limit = int(os.environ.get('PAGE_RETRY_LIMIT', str(DEFAULT_PAGE_RETRY_LIMIT)))
                 
-                # Save results and send alerts if threats found
-                if threats_detected:
-                    save_threat_results(job_id, api, threats_detected)
-                    send_threat_alert(job_id, api, threats_detected, sns_message.get('Video', {}))
-                    
-                    # Send CloudWatch metrics
-                    send_metrics(len(threats_detected), api)
+                if failures > retry_limit:
+                    raise RuntimeError(f"{api} job {job_id} failed {failures} times: {pending['error']}")
                 
-            elif job_status == 'FAILED':
-                print(f"Job {job_id} failed")
-                sns.publish(
-                    TopicArn=os.environ['THREAT_ALERT_TOPIC'],
-                    Subject=f"Video Analysis Failed - {api}",
-                    Message=f"Analysis job {job_id} failed for {api}"
-                )
-                
-    except Exception as e:
-        print(f"Error processing results: {str(e)}")
-        raise e
+                pending['failures'] = failures
+                delay_seconds = min(900, 10 * 2 ** failures)
+            
+            checkpoint_key = save_checkpoint(job_id, api, pending)
+            enqueue_continuation(sns_message, checkpoint_key, delay_seconds)
+            return
+        
+        if sns_message.get('Checkpoint'):
+            delete_checkpoint(sns_message['Checkpoint'])
+        
+        # Save results and send alerts if threats found
+        if threats_detected:
+            save_threat_results(job_id, api, threats_detected, label_counts)
+            send_threat_alert(job_id, api, threats_detected, sns_message.get('Video', {}))
+            
+            # Send CloudWatch metrics
+            send_metrics(len(threats_detected), api)
+        
+        save_job_status(job_id, api, job_status, len(threats_detected))
+        
+    elif job_status == 'FAILED':
+        print(f"Job {job_id} failed")
+        save_job_status(job_id, api, job_status)
+        sns.publish(
+            TopicArn=os.environ['THREAT_ALERT_TOPIC'],
+            Subject=f"Video Analysis Failed - {api}",
+            Message=f"Analysis job {job_id} failed for {api}"
+        )
+
+def deadline_reached(context):
+    """Check whether the invocation is close enough to its timeout to stop"""
+    if context is None:
+        return False
     
-    return {
-        'statusCode': 200,
-        'body': json.dumps('Results processed successfully')
-    }
+    margin = int(os.environ.get('CHECKPOINT_MARGIN_MS', str(DEFAULT_CHECKPOINT_MARGIN_MS)))
+    return context.get_remaining_time_in_millis() < margin
 
-def process_label_detection(job_id):
-    """Process label detection results for threats"""
-    threats = []
-    min_confidence = float(os.environ.get('MIN_CONFIDENCE', '80'))
+def process_label_detection(job_id, context=None, checkpoint=None, label_counts=None):
+    """
+    Process label detection results for threats.
+    
+    Returns (threats, pending) where pending is a checkpoint to resume from if
+    the deadline was reached or a page failed before the last page, otherwise
+    None. A failed page leaves next_token on that page and sets 'error', so a
+    partial result is never treated as final. Per-label threat counts are
+    accumulated into label_counts.
+    """
+    threats = checkpoint['threats'] if checkpoint else []
+    next_token = checkpoint['next_token'] if checkpoint else None
+    if label_counts is None:
+        label_counts = {}
+    if checkpoint:
+        label_counts.update(checkpoint.get('label_counts', {}))
+    min_confidence = get_min_confidence()
     
     try:
-        response = rekognition.get_label_detection(JobId=job_id)
-        
-        for label_detection in response.get('Labels', []):
-            label = label_detection.get('Label', {})
+        while True:
+            params = {'JobId': job_id}
+            if next_token:
+                params['NextToken'] = next_token
             
-            if (label.get('Name') in THREAT_LABELS and 
-                label.get('Confidence', 0) >= min_confidence):
-                
-                threats.append({
-                    'type': 'THREAT_LABEL',
-                    'label': label.get('Name'),
-                    'confidence': label.get('Confidence'),
-                    'timestamp': label_detection.get('Timestamp'),
-                    'instances': label.get('Instances', [])
-                })
+            response = rekognition.get_label_detection(**params)
+            threats.extend(filter_label_detections(response.get('Labels', []), min_confidence, label_counts))
+            
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+            
+            if deadline_reached(context):
+                return threats, {'next_token': next_token, 'threats': threats, 'label_counts': label_counts}
                 
     except Exception as e:
-        print(f"Error processing label detection: {str(e)}")
+        print(f"Error processing label detection page: {str(e)}")
+        return threats, {'next_token': next_token, 'threats': threats, 'label_counts': label_counts, 'error': str(e)}
     
-    return threats
+    return threats, None
 
-def process_content_moderation(job_id):
+def process_content_moderation(job_id, context=None, checkpoint=None, label_counts=None):
     """Process content moderation results for unsafe content"""
-    threats = []
-    min_confidence = float(os.environ.get('MIN_CONFIDENCE', '80'))
+    threats = checkpoint['threats'] if checkpoint else []
+    next_token = checkpoint['next_token'] if checkpoint else None
+    if label_counts is None:
+        label_counts = {}
+    if checkpoint:
+        label_counts.update(checkpoint.get('label_counts', {}))
+    min_confidence = get_min_confidence()
     
     try:
-        response = rekognition.get_content_moderation(JobId=job_id)
-        
-        for moderation_detection in response.get('ModerationLabels', []):
-            moderation_label = moderation_detection.get('ModerationLabel', {})
+        while True:
+            params = {'JobId': job_id}
+            if next_token:
+                params['NextToken'] = next_token
+            
+            response = rekognition.get_content_moderation(**params)
+            threats.extend(filter_moderation_detections(response.get('ModerationLabels', []), min_confidence, label_counts))
+            
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
             
-            if moderation_label.get('Confidence', 0) >= min_confidence:
-                threats.append({
-                    'type': 'UNSAFE_CONTENT',
-                    'label': moderation_label.get('Name'),
-                    'confidence': moderation_label.get('Confidence'),
-                    'timestamp': moderation_detection.get('Timestamp'),
-                    'parent_name': moderation_label.get('ParentName', '')
-                })
+            if deadline_reached(context):
+                return threats, {'next_token': next_token, 'threats': threats, 'label_counts': label_counts}
                 
     except Exception as e:
-        print(f"Error processing content moderation: {str(e)}")
+        print(f"Error processing content moderation page: {str(e)}")
+        return threats, {'next_token': next_token, 'threats': threats, 'label_counts': label_counts, 'error': str(e)}
     
-    return threats
+    return threats, None
 
-def process_person_tracking(job_id):
+def process_person_tracking(job_id, context=None, checkpoint=None):
     """Process person tracking for crowd detection"""
     threats = []
+    next_token = checkpoint['next_token'] if checkpoint else None
+    
+    # Group persons by timestamp to detect crowds; the same timestamp can span pages
+    persons_by_timestamp = {}
+    if checkpoint:
+        persons_by_timestamp = {timestamp: count for timestamp, count in checkpoint['person_counts']}
     
     try:
-        response = rekognition.get_person_tracking(JobId=job_id)
-        
-        # Group persons by timestamp to detect crowds
-        persons_by_timestamp = {}
-        
-        for person_detection in response.get('Persons', []):
-            timestamp = person_detection.get('Timestamp', 0)
-            if timestamp not in persons_by_timestamp:
-                persons_by_timestamp[timestamp] = []
-            persons_by_timestamp[timestamp].append(person_detection)
-        
-        # Check for crowd formation (more than 5 people at same time)
-        for timestamp, persons in persons_by_timestamp.items():
-            if len(persons) > 5:
-                threats.append({
-                    'type': 'CROWD_DETECTION',
-                    'label': 'Large Crowd',
-                    'confidence': 95.0,  # High confidence for counting
-                    'timestamp': timestamp,
-                    'person_count': len(persons)
-                })
+        while True:
+            params = {'JobId': job_id}
+            if next_token:
+                params['NextToken'] = next_token
+            
+            response = rekognition.get_person_tracking(**params)
+            count_persons_by_timestamp(response.get('Persons', []), persons_by_timestamp)
+            
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+            
+            if deadline_reached(context):
+                # JSON object keys are strings, so keep timestamps as pairs
+                return threats, {
+                    'next_token': next_token,
+                    'person_counts': list(persons_by_timestamp.items())
+                }
                 
     except Exception as e:
-        print(f"Error processing person tracking: {str(e)}")
+        print(f"Error processing person tracking page: {str(e)}")
+        return threats, {
+            'next_token': next_token,
+            'person_counts': list(persons_by_timestamp.items()),
+            'error': str(e)
+        }
+    
+    threats.extend(detect_crowds(persons_by_timestamp))
+    
+    return threats, None
+
+def checkpoint_key_for(job_id, api):
+    return f"checkpoints/{job_id}-{api}.json"
+
+def save_checkpoint(job_id, api, pending):
+    """Save partial progress to S3 and return its key"""
+    s3_key = checkpoint_key_for(job_id, api)
     
-    return threats
+    s3.put_object(
+        Bucket=os.environ['RESULTS_BUCKET'],
+        Key=s3_key,
+        Body=json.dumps(pending),
+        ContentType='application/json'
+    )
+    
+    print(f"Saved checkpoint to s3://{os.environ['RESULTS_BUCKET']}/{s3_key}")
+    return s3_key
 
-def save_threat_results(job_id, api, threats):
+def load_checkpoint(s3_key):
+    """Load partial progress saved by an earlier invocation, or None once it has been deleted"""
+    try:
+        response = s3.get_object(Bucket=os.environ['RESULTS_BUCKET'], Key=s3_key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+def delete_checkpoint(s3_key):
+    """Remove a checkpoint once its job has been fully processed"""
+    try:
+        s3.delete_object(Bucket=os.environ['RESULTS_BUCKET'], Key=s3_key)
+    except Exception as e:
+        print(f"Error deleting checkpoint: {str(e)}")
+
+def enqueue_continuation(sns_message, checkpoint_key=None, delay_seconds=0):
+    """Put the job back on the results queue, optionally pointing at a checkpoint"""
+    message = dict(sns_message)
+    if checkpoint_key:
+        message['Checkpoint'] = checkpoint_key
+    
+    # Same envelope SNS uses so lambda_handler parses it like any other record
+    sqs.send_message(
+        QueueUrl=os.environ['RESULTS_QUEUE_URL'],
+        MessageBody=json.dumps({
+            'Type': 'Continuation',
+            'Message': json.dumps(message)
+        }),
+        DelaySeconds=delay_seconds
+    )
+    
+    print(f"Enqueued continuation for {message['API']} job {message['JobId']}")
+
+def save_threat_results(job_id, api, threats, label_counts=None):
     """Save threat detection results to S3"""
     try:
         results = {
@@ -162,6 +310,9 @@ def save_threat_results(job_id, api, threats):
             'threat_count': len(threats)
         }
         
+        if label_counts:
+            results['label_counts'] = label_counts
+        
         s3_key = f"threat-results/{datetime.utcnow().strftime('%Y/%m/%d')}/{job_id}-{api}.json"
         
         s3.put_object(
@@ -176,6 +327,25 @@ def save_threat_results(job_id, api, threats):
     except Exception as e:
         print(f"Error saving results: {str(e)}")
 
+def save_job_status(job_id, api, status, threat_count=0):
+    """Record how a job finished, so near-duplicate uploads only reuse fully processed analyses"""
+    try:
+        s3.put_object(
+            Bucket=os.environ['RESULTS_BUCKET'],
+            Key=f"job-status/{job_id}.json",
+            Body=json.dumps({
+                'job_id': job_id,
+                'api': api,
+                'status': status,
+                'threat_count': threat_count,
+                'timestamp': datetime.utcnow().isoformat()
+            }),
+            ContentType='application/json'
+        )
+        
+    except Exception as e:
+        print(f"Error saving job status: {str(e)}")
+
 def send_threat_alert(job_id, api, threats, video_info):
     """Send threat alert notification"""
     try:
@@ -0,0 +1,165 @@
+import bisect
+import json
+import os
+import boto3
+from datetime import datetime, timedelta
+
+# Number of one-minute buckets kept in the snapshot
+WINDOW_MINUTES = 60
+
+# Number of threats kept in the top threats list
+TOP_THREATS = 10
+
+SEVERITY_RANK = {'Low': 1, 'Medium': 2, 'High': 3, 'Critical': 4}
+
+SNAPSHOT_ID = 'dashboard'
+
+def empty_snapshot():
+    """Snapshot with no results folded in yet"""
+    return {
+        'window_minutes': WINDOW_MINUTES,
+        'updated_at': None,
+        'minutes': [],
+        'totals': {'severity': {}, 'labels': {}},
+        'top_threats': []
+    }
+
+def minute_key(now):
+    return now.strftime('%Y-%m-%dT%H:%M')
+
+def add_counts(totals, counts, sign=1):
+    """Add (or with sign=-1 subtract) one count map into another"""
+    for name, count in counts.items():
+        value = totals.get(name, 0) + sign * count
+        if value > 0:
+            totals[name] = value
+        else:
+            totals.pop(name, None)
+
+def evict_expired(snapshot, now=None):
+    """
+    Drop minute buckets and top threats that fell out of the window at now.
+
+    Expired buckets are subtracted from the running totals. Used on every
+    update and on every read, so a snapshot left untouched during a quiet
+    period never reports stale counts.
+    """
+    if now is None:
+        now = datetime.utcnow()
+
+    oldest_minute = minute_key(now - timedelta(minutes=WINDOW_MINUTES - 1))
+    totals = snapshot['totals']
+
+    # Buckets are kept sorted by minute, so expired ones are at the front
+    minutes = snapshot['minutes']
+    while minutes and minutes[0]['minute'] < oldest_minute:
+        expired = minutes.pop(0)
+        add_counts(totals['severity'], expired['severity'], -1)
+        add_counts(totals['labels'], expired['labels'], -1)
+
+    snapshot['top_threats'] = [t for t in snapshot['top_threats'] if t['minute'] >= oldest_minute]
+    return snapshot
+
+def get_bucket(minutes, minute):
+    """Find or insert the bucket for minute, keeping buckets sorted"""
+    keys = [bucket['minute'] for bucket in minutes]
+    position = bisect.bisect_left(keys, minute)
+
+    # Lambda clocks can differ slightly, so a result may land before the newest bucket
+    if position == len(minutes) or minutes[position]['minute'] != minute:
+        minutes.insert(position, {'minute': minute, 'severity': {}, 'labels': {}})
+
+    return minutes[position]
+
+def apply_result(snapshot, result, now=None):
+    """
+    Fold one analysis result into the snapshot.
+
+    Minute buckets older than the window are evicted and subtracted from the
+    running totals, so every update touches a bounded amount of state no
+    matter how many results have been seen.
+    """
+    if now is None:
+        now = datetime.utcnow()
+
+    current_minute = minute_key(now)
+    totals = snapshot['totals']
+
+    evict_expired(snapshot, now)
+    bucket = get_bucket(snapshot['minutes'], current_minute)
+
+    severity_counts = {}
+    label_counts = {}
+    for threat in result.get('threats', []):
+        severity = threat.get('severity', 'Low')
+        label = threat.get('type', 'Unknown')
+        severity_counts[severity] = severity_counts.get(severity, 0) + 1
+        label_counts[label] = label_counts.get(label, 0) + 1
+
+    add_counts(bucket['severity'], severity_counts)
+    add_counts(bucket['labels'], label_counts)
+    add_counts(totals['severity'], severity_counts)
+    add_counts(totals['labels'], label_counts)
+
+    # Keep the highest severity, most confident threats still inside the window
+    top_threats = snapshot['top_threats']
+    for threat in result.get('threats', []):
+        top_threats.append({
+            'type': threat.get('type', 'Unknown'),
+            'severity': threat.get('severity', 'Low'),
+            'confidence': threat.get('confidence', 0),
+            'video_key': result.get('video_key'),
+            'minute': current_minute
+        })
+    top_threats.sort(
+        key=lambda t: (SEVERITY_RANK.get(t['severity'], 0), t['confidence'], t['minute']),
+        reverse=True
+    )
+    snapshot['top_threats'] = top_threats[:TOP_THREATS]
+
+    snapshot['updated_at'] = now.isoformat()
+    return snapshot
+
+def load_snapshot(table):
+    """Read the stored snapshot and its version from DynamoDB"""
+    item = table.get_item(Key={'aggregateId': SNAPSHOT_ID}).get('Item')
+    if not item:
+        return empty_snapshot(), 0
+    return json.loads(item['snapshot']), int(item['version'])
+
+def record_result(result, retries=3):
+    """Fold a result into the stored snapshot using optimistic locking"""
+    try:
+        aggregates_table = os.environ.get('AGGREGATES_TABLE')
+
+        if not aggregates_table:
+            print("⚠️ Missing aggregates table configuration")
+            return None
+
+        table = boto3.resource('dynamodb').Table(aggregates_table)
+
+        for attempt in range(retries):
+            snapshot, version = load_snapshot(table)
+            snapshot = apply_result(snapshot, result)
+
+            try:
+                table.put_item(
+                    Item={
+                        'aggregateId': SNAPSHOT_ID,
+                        'snapshot': json.dumps(snapshot),
+                        'version': version + 1
+                    },
+                    ConditionExpression='attribute_not_exists(aggregateId) OR version = :version',
+                    ExpressionAttributeValues={':version': version}
+                )
+                print(f"✅ Updated rolling aggregates (version {version + 1})")
+                return snapshot
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                print(f"Aggregate snapshot changed concurrently, retrying ({attempt + 1}/{retries})")
+
+        print("❌ Gave up updating rolling aggregates")
+
+    except Exception as e:
+        print(f"❌ Aggregate update error: {str(e)}")
+
+    return None
@@ -0,0 +1,167 @@
+import os
+
+from detection_batch import DetectionBatch, LabelTable
+
+# Threat detection labels
+THREAT_LABELS = [
+    'Weapon', 'Gun', 'Knife', 'Rifle', 'Handgun', 'Pistol',
+    'Fire', 'Smoke', 'Explosion', 'Violence', 'Fighting',
+    'Crowd', 'Protest', 'Riot', 'Suspicious Activity'
+]
+
+# Label name interning shared by every batch in this process
+LABEL_TABLE = LabelTable(THREAT_LABELS)
+
+# More than this many people at the same timestamp counts as a crowd
+DEFAULT_CROWD_SIZE = 5
+
+def get_min_confidence():
+    """Minimum confidence for a detection to count as a threat"""
+    return float(os.environ.get('MIN_CONFIDENCE', '80'))
+
+def get_crowd_size():
+    """Person count a timestamp has to exceed to be reported as a crowd"""
+    return int(os.environ.get('CROWD_SIZE_THRESHOLD', str(DEFAULT_CROWD_SIZE)))
+
+def filter_label_detections(label_detections, min_confidence=None, label_counts=None):
+    """
+    Turn Rekognition label detections into threat records.
+
+    Filtering runs on a columnar batch; dicts are only built for detections
+    that pass. When label_counts is given, per-label threat counts are added to it.
+    """
+    if min_confidence is None:
+        min_confidence = get_min_confidence()
+
+    batch = DetectionBatch.decode(label_detections, 'Label', LABEL_TABLE)
+    mask = batch.threat_mask(LABEL_TABLE, min_confidence)
+
+    if label_counts is not None:
+        batch.label_counts(LABEL_TABLE, mask, label_counts)
+
+    threats = []
+
+    for label_detection in batch.surviving(mask):
+        label = label_detection.get('Label', {})
+
+        threats.append({
+            'type': 'THREAT_LABEL',
+            'label': label.get('Name'),
+            'confidence': label.get('Confidence'),
+            'timestamp': label_detection.get('Timestamp'),
+            'instances': label.get('Instances', [])
+        })
+
+    return threats
+
+def filter_moderation_detections(moderation_detections, min_confidence=None, label_counts=None):
+    """Turn Rekognition content moderation detections into threat records"""
+    if min_confidence is None:
+        min_confidence = get_min_confidence()
+
+    batch = DetectionBatch.decode(moderation_detections, 'ModerationLabel', LABEL_TABLE)
+    mask = batch.confidence_mask(min_confidence)
+
+    if label_counts is not None:
+        batch.label_counts(LABEL_TABLE, mask, label_counts)
+
+    threats = []
+
+    for moderation_detection in batch.surviving(mask):
+        moderation_label = moderation_detection.get('ModerationLabel', {})
+
+        threats.append({
+            'type': 'UNSAFE_CONTENT',
+            'label': moderation_label.get('Name'),
+            'confidence': moderation_label.get('Confidence'),
+            'timestamp': moderation_detection.get('Timestamp'),
+            'parent_name': moderation_label.get('ParentName', '')
+        })
+
+    return threats
+
+def count_persons_by_timestamp(person_detections, counts=None):
+    """Group Rekognition person detections by timestamp and count them"""
+    if counts is None:
+        counts = {}
+
+    for person_detection in person_detections:
+        timestamp = person_detection.get('Timestamp', 0)
+        counts[timestamp] = counts.get(timestamp, 0) + 1
+
+    return counts
+
+def detect_crowds(person_counts, crowd_size=None):
+    """Turn per-timestamp person counts into crowd threat records"""
+    if crowd_size is None:
+        crowd_size = get_crowd_size()
+
+    threats = []
+
+    for timestamp, person_count in person_counts.items():
+        if person_count > crowd_size:
+            threats.append({
+                'type': 'CROWD_DETECTION',
+                'label': 'Large Crowd',
+                'confidence': 95.0,  # High confidence for counting
+                'timestamp': timestamp,
+                'person_count': person_count
+            })
+
+    return threats
+
+def reevaluate_threats(api, threats, min_confidence=None, crowd_size=None):
+    """
+    Re-apply the current filters to threats stored by save_threat_results.
+
+    Stored threats are mapped back to the Rekognition shapes they came from
+    and pushed through the same filter functions the results processor uses.
+    Detections dropped at analysis time are not stored, so this can only
+    narrow a result set; use raw Rekognition responses to widen it.
+    """
+    if api == 'StartLabelDetection':
+        return filter_label_detections([
+            {
+                'Timestamp': threat.get('timestamp'),
+                'Label': {
+                    'Name': threat.get('label'),
+                    'Confidence': threat.get('confidence', 0),
+                    'Instances': threat.get('instances', [])
+                }
+            }
+            for threat in threats
+        ], min_confidence)
+
+    if api == 'StartContentModeration':
+        return filter_moderation_detections([
+            {
+                'Timestamp': threat.get('timestamp'),
+                'ModerationLabel': {
+                    'Name': threat.get('label'),
+                    'Confidence': threat.get('confidence', 0),
+                    'ParentName': threat.get('parent_name', '')
+                }
+            }
+            for threat in threats
+        ], min_confidence)
+
+    if api == 'StartPersonTracking':
+        return detect_crowds({
+            threat.get('timestamp'): threat.get('person_count', 0)
+            for threat in threats
+        }, crowd_size)
+
+    return list(threats)
+
+def evaluate_rekognition_response(api, response, min_confidence=None, crowd_size=None):
+    """Run a raw Get* Rekognition response through the threat filters"""
+    if api == 'StartLabelDetection':
+        return filter_label_detections(response.get('Labels', []), min_confidence)
+
+    if api == 'StartContentModeration':
+        return filter_moderation_detections(response.get('ModerationLabels', []), min_confidence)
+
+    if api == 'StartPersonTracking':
+        return detect_crowds(count_persons_by_timestamp(response.get('Persons', [])), crowd_size)
+
+    return []
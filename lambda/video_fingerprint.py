@@ -0,0 +1,268 @@
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+# Frames sampled per video, at evenly spaced fractions of its duration
+SAMPLE_FRAMES = 8
+
+# Frames are reduced to HASH_INPUT x HASH_INPUT grayscale before the DCT
+HASH_INPUT = 32
+
+# Low frequency block kept from the DCT; HASH_BITS x HASH_BITS bits per frame
+HASH_BITS = 8
+
+# Default max Hamming distance over the whole fingerprint to count as a near-duplicate
+DEFAULT_MAX_DISTANCE = 48
+
+# Flat frames (blank, dark, fades) all hash to nearly the same bits, so a sampled
+# frame with a grayscale standard deviation below this makes the video unmatchable
+MIN_FRAME_STD = 10.0
+
+# Matched videos must also agree on duration within this fraction (or one second)
+DURATION_TOLERANCE = 0.02
+
+# One object per fingerprint: <prefix><ms timestamp>-<fingerprint hex>.json
+INDEX_PREFIX = 'fingerprints/'
+
+FINGERPRINT_HEX_DIGITS = SAMPLE_FRAMES * HASH_BITS * HASH_BITS // 4
+
+# How far back each incremental index sync re-lists, to catch late writers
+SYNC_LOOKBACK_MS = 5 * 60 * 1000
+
+def dct_matrix(size):
+    """Orthonormal DCT-II basis, so dct2(x) = D @ x @ D.T"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+_DCT = dct_matrix(HASH_INPUT)
+
+def phash_frame(pixels):
+    """64-bit DCT perceptual hash of a HASH_INPUT x HASH_INPUT grayscale frame"""
+    coefficients = _DCT @ pixels.astype(np.float64) @ _DCT.T
+    low = coefficients[:HASH_BITS, :HASH_BITS].flatten()
+
+    # The DC term only carries overall brightness, leave it out of the median
+    bits = low > np.median(low[1:])
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+def combine_hashes(frame_hashes):
+    """Concatenate per-frame hashes into one fingerprint so Hamming distance stays a metric"""
+    fingerprint = 0
+    for frame_hash in frame_hashes:
+        fingerprint = (fingerprint << (HASH_BITS * HASH_BITS)) | frame_hash
+    return fingerprint
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+def durations_match(a, b):
+    return abs(a - b) <= max(1.0, DURATION_TOLERANCE * max(a, b))
+
+def get_ffmpeg_path():
+    """
+    ffmpeg binary named by FFMPEG_PATH, e.g. /opt/bin/ffmpeg from a Lambda layer.
+
+    Duplicate detection is off unless FFMPEG_PATH is set; returns None when it
+    is unset or doesn't point at an executable.
+    """
+    path = os.environ.get('FFMPEG_PATH')
+    return shutil.which(path) if path else None
+
+def extract_frame(ffmpeg, source, position, timeout):
+    """Decode one frame at position seconds, scaled down to grayscale pixels"""
+    output = subprocess.run(
+        [
+            ffmpeg, '-loglevel', 'error',
+            '-ss', f"{position:.3f}", '-i', source,
+            '-frames:v', '1',
+            '-vf', f"scale={HASH_INPUT}:{HASH_INPUT},format=gray",
+            '-f', 'rawvideo', '-'
+        ],
+        capture_output=True,
+        timeout=timeout,
+        check=True
+    ).stdout
+
+    if len(output) < HASH_INPUT * HASH_INPUT:
+        raise ValueError(f"No frame decoded at {position:.3f}s")
+
+    return np.frombuffer(output[:HASH_INPUT * HASH_INPUT], dtype=np.uint8).reshape(HASH_INPUT, HASH_INPUT)
+
+def fingerprint_video(source, duration, deadline):
+    """
+    Fingerprint a video from SAMPLE_FRAMES frames spread over its duration.
+
+    source can be a local path or an HTTP(S) URL such as a presigned S3 URL;
+    ffmpeg seeks with range requests so only the sampled frames are fetched.
+    deadline is a time.monotonic() value; each ffmpeg call only gets the time
+    left before it, and TimeoutError is raised once it has passed.
+    Returns None when ffmpeg isn't available or a sampled frame is too flat
+    to tell videos apart.
+    """
+    ffmpeg = get_ffmpeg_path()
+    if not ffmpeg:
+        print("⚠️ ffmpeg not available, skipping fingerprint")
+        return None
+
+    # Relative positions keep re-encoded or re-muxed copies aligned
+    positions = [duration * (i + 1) / (SAMPLE_FRAMES + 1) for i in range(SAMPLE_FRAMES)]
+    frame_hashes = []
+
+    for position in positions:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Fingerprint time budget exhausted")
+
+        pixels = extract_frame(ffmpeg, source, position, remaining)
+        if pixels.std() < MIN_FRAME_STD:
+            print(f"⚠️ Low detail frame at {position:.1f}s, skipping fingerprint")
+            return None
+
+        frame_hashes.append(phash_frame(pixels))
+
+    return combine_hashes(frame_hashes)
+
+class BKTree:
+    """Burkhard-Keller tree over fingerprints for Hamming nearest-neighbour lookup"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, fingerprint, item):
+        node = (fingerprint, item, {})
+
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+        while True:
+            distance = hamming_distance(fingerprint, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, fingerprint, max_distance):
+        """Return (distance, item) pairs within max_distance, closest first"""
+        matches = []
+        pending = [self.root] if self.root else []
+
+        while pending:
+            node = pending.pop()
+            distance = hamming_distance(fingerprint, node[0])
+
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+
+            # Triangle inequality: only children in this band can be close enough
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+
+        return sorted(matches, key=lambda match: match[0])
+
+class FingerprintIndex:
+    """
+    BK-tree over the fingerprint objects stored under INDEX_PREFIX.
+
+    Fingerprints are encoded in the object keys, so syncing only lists keys,
+    and only keys written since the last sync. Kept at module level, a warm
+    container pays for new uploads only instead of reloading the whole index.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.tree = BKTree()
+        self.newest_ms = None
+        self.recent_keys = set()
+
+    def sync(self, s3):
+        """Add fingerprints stored since the last sync; S3 errors propagate"""
+        params = {'Bucket': self.bucket, 'Prefix': INDEX_PREFIX}
+
+        # Another container's clock may lag ours, so re-list a short window back
+        if self.newest_ms is not None:
+            cutoff_ms = self.newest_ms - SYNC_LOOKBACK_MS
+            params['StartAfter'] = f"{INDEX_PREFIX}{cutoff_ms:013d}"
+            self.recent_keys = {key for key in self.recent_keys if entry_time_ms(key) > cutoff_ms}
+
+        added = 0
+        for page in s3.get_paginator('list_objects_v2').paginate(**params):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                fingerprint = parse_entry_key(key)
+                if fingerprint is None or key in self.recent_keys:
+                    continue
+
+                self.tree.add(fingerprint, key)
+                self.recent_keys.add(key)
+                self.newest_ms = max(self.newest_ms or 0, entry_time_ms(key))
+                added += 1
+
+        return added
+
+    def search(self, fingerprint, max_distance):
+        return self.tree.search(fingerprint, max_distance)
+
+_indexes = {}
+
+def get_index(s3, bucket):
+    """Cached index for bucket, brought up to date with S3"""
+    if bucket not in _indexes:
+        _indexes[bucket] = FingerprintIndex(bucket)
+
+    index = _indexes[bucket]
+    index.sync(s3)
+    return index
+
+def entry_key(fingerprint):
+    # Millisecond timestamps keep keys in write order for StartAfter listing
+    return f"{INDEX_PREFIX}{int(time.time() * 1000):013d}-{fingerprint:0{FINGERPRINT_HEX_DIGITS}x}.json"
+
+def entry_time_ms(key):
+    return int(key[len(INDEX_PREFIX):len(INDEX_PREFIX) + 13])
+
+def parse_entry_key(key):
+    """Fingerprint encoded in an entry key, or None for anything else under the prefix"""
+    name = key[len(INDEX_PREFIX):]
+    if not name.endswith('.json'):
+        return None
+
+    timestamp, _, fingerprint_hex = name[:-len('.json')].partition('-')
+    if len(timestamp) != 13 or not timestamp.isdigit() or len(fingerprint_hex) != FINGERPRINT_HEX_DIGITS:
+        return None
+
+    try:
+        return int(fingerprint_hex, 16)
+    except ValueError:
+        return None
+
+def save_entry(s3, bucket, fingerprint, video_key, duration_seconds, job_metadata):
+    """Store a fingerprint as its own object, so concurrent uploads never overwrite each other"""
+    key = entry_key(fingerprint)
+
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({'video_key': video_key, 'duration_seconds': duration_seconds, 'jobs': job_metadata}),
+        ContentType='application/json'
+    )
+
+    return key
+
+def load_entry(s3, bucket, key):
+    """Load the analysis a matched fingerprint points at"""
+    response = s3.get_object(Bucket=bucket, Key=key)
+    return json.loads(response['Body'].read())
@@ -0,0 +1,374 @@
+import os
+import struct
+from collections import OrderedDict
+
+# Size of each ranged read; box headers and metadata boxes land in a few of these
+CHUNK_SIZE = 16 * 1024
+
+# Upper bound on bytes fetched per probe, so a malformed file can't pull the whole video
+MAX_PROBE_BYTES = 512 * 1024
+
+# Number of probe results kept across warm invocations
+CACHE_SIZE = 256
+
+_probe_cache = OrderedDict()
+
+class RangeReader:
+    """Reads byte ranges through a small chunk cache, counting what was fetched"""
+
+    def __init__(self, fetch, size):
+        self.fetch = fetch
+        self.size = size
+        self.chunks = {}
+        self.bytes_read = 0
+
+    def read(self, offset, length):
+        if offset >= self.size or length <= 0:
+            return b''
+        length = min(length, self.size - offset)
+
+        data = b''
+        first = offset // CHUNK_SIZE
+        last = (offset + length - 1) // CHUNK_SIZE
+
+        for index in range(first, last + 1):
+            if index not in self.chunks:
+                start = index * CHUNK_SIZE
+                end = min(start + CHUNK_SIZE, self.size) - 1
+                if self.bytes_read + (end - start + 1) > MAX_PROBE_BYTES:
+                    raise ValueError("Probe read budget exceeded")
+                self.chunks[index] = self.fetch(start, end)
+                self.bytes_read += len(self.chunks[index])
+            data += self.chunks[index]
+
+        skip = offset - first * CHUNK_SIZE
+        return data[skip:skip + length]
+
+def probe_s3_object(s3, bucket, key, size, etag=None):
+    """Probe a video in S3 using ranged GETs; results are cached per object version"""
+    cache_key = ('s3', bucket, key, etag or size)
+
+    def fetch(start, end):
+        response = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+        return response['Body'].read()
+
+    return _cached_probe(cache_key, fetch, size)
+
+def probe_local_file(path):
+    """Probe a video on local disk"""
+    stat = os.stat(path)
+    cache_key = ('file', os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+    def fetch(start, end):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start + 1)
+
+    return _cached_probe(cache_key, fetch, stat.st_size)
+
+def _cached_probe(cache_key, fetch, size):
+    if cache_key in _probe_cache:
+        _probe_cache.move_to_end(cache_key)
+        return _probe_cache[cache_key]
+
+    metadata = probe(RangeReader(fetch, size))
+
+    _probe_cache[cache_key] = metadata
+    if len(_probe_cache) > CACHE_SIZE:
+        _probe_cache.popitem(last=False)
+
+    return metadata
+
+def probe(reader):
+    """
+    Extract container metadata from an MP4/MOV or Matroska/WebM file.
+
+    Returns a dict with duration, resolution, frame rate, codec and bitrate,
+    or None when the container isn't recognised or can't be parsed.
+    """
+    try:
+        head = reader.read(0, 12)
+
+        if head[4:8] in (b'ftyp', b'moov', b'free', b'mdat', b'wide', b'skip'):
+            metadata = probe_mp4(reader)
+        elif head[:4] == b'\x1a\x45\xdf\xa3':
+            metadata = probe_matroska(reader)
+        else:
+            return None
+
+    except Exception as e:
+        print(f"Container probe failed: {str(e)}")
+        return None
+
+    duration = metadata.get('duration_seconds')
+    if duration:
+        metadata['bitrate_bps'] = int(reader.size * 8 / duration)
+    metadata['bytes_read'] = reader.bytes_read
+
+    return metadata
+
+# ---------------------------------------------------------------- MP4 / MOV
+
+MP4_CONTAINER_BOXES = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+
+# Variable frame rate files can have huge stts tables; skip frame rate for those
+MAX_STTS_BYTES = 64 * 1024
+
+def iter_mp4_boxes(reader, start, end):
+    """Yield (type, payload_offset, payload_size) for boxes between start and end"""
+    offset = start
+
+    while offset + 8 <= end:
+        size, box_type = struct.unpack('>I4s', reader.read(offset, 8))
+        header = 8
+
+        if size == 1:
+            size = struct.unpack('>Q', reader.read(offset + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header:
+            break
+
+        yield box_type, offset + header, size - header
+        offset += size
+
+def read_full_box(reader, offset, size, length):
+    """Read a FullBox payload and return (version, body)"""
+    data = reader.read(offset, min(size, length))
+    return data[0], data[4:]
+
+def probe_mp4(reader):
+    metadata = {'container': 'mp4'}
+
+    for box_type, offset, size in iter_mp4_boxes(reader, 0, reader.size):
+        if box_type == b'moov':
+            parse_mp4_moov(reader, offset, size, metadata)
+            break
+
+    return metadata
+
+def parse_mp4_moov(reader, offset, size, metadata):
+    for box_type, child_offset, child_size in iter_mp4_boxes(reader, offset, offset + size):
+        if box_type == b'mvhd':
+            timescale, duration = parse_mp4_header_times(reader, child_offset, child_size)
+            if timescale:
+                metadata['duration_seconds'] = round(duration / timescale, 3)
+
+        elif box_type == b'trak':
+            track = {}
+            parse_mp4_track(reader, child_offset, child_size, track)
+
+            # Only the first video track describes the picture
+            if track.get('handler') == b'vide' and 'codec' not in metadata:
+                metadata['codec'] = track.get('codec')
+                metadata['width'] = track.get('width')
+                metadata['height'] = track.get('height')
+
+                if track.get('timescale') and track.get('duration') and track.get('sample_count'):
+                    seconds = track['duration'] / track['timescale']
+                    metadata['frame_rate'] = round(track['sample_count'] / seconds, 3)
+
+def parse_mp4_track(reader, offset, size, track):
+    for box_type, child_offset, child_size in iter_mp4_boxes(reader, offset, offset + size):
+        if box_type in MP4_CONTAINER_BOXES:
+            parse_mp4_track(reader, child_offset, child_size, track)
+
+        elif box_type == b'tkhd':
+            version, body = read_full_box(reader, child_offset, child_size, 96)
+            # Width and height are 16.16 fixed point at the end of the box
+            position = 84 if version == 1 else 72
+            width, height = struct.unpack('>II', body[position:position + 8])
+            if width and height:
+                track['width'] = width >> 16
+                track['height'] = height >> 16
+
+        elif box_type == b'mdhd':
+            track['timescale'], track['duration'] = parse_mp4_header_times(reader, child_offset, child_size)
+
+        elif box_type == b'hdlr':
+            _, body = read_full_box(reader, child_offset, child_size, 12)
+            track['handler'] = body[4:8]
+
+        elif box_type == b'stsd':
+            _, body = read_full_box(reader, child_offset, child_size, 48)
+            track['codec'] = body[8:12].decode('latin-1').strip()
+            if 'width' not in track and len(body) >= 40:
+                track['width'], track['height'] = struct.unpack('>HH', body[36:40])
+
+        elif box_type == b'stts' and child_size <= MAX_STTS_BYTES:
+            _, body = read_full_box(reader, child_offset, child_size, child_size)
+            entry_count = struct.unpack('>I', body[:4])[0]
+            entries = struct.unpack(f'>{entry_count * 2}I', body[4:4 + entry_count * 8])
+            track['sample_count'] = sum(entries[0::2])
+
+def parse_mp4_header_times(reader, offset, size):
+    """Return (timescale, duration) from an mvhd or mdhd box"""
+    version, body = read_full_box(reader, offset, size, 32)
+
+    if version == 1:
+        return struct.unpack('>IQ', body[16:28])
+    return struct.unpack('>II', body[8:16])
+
+# ---------------------------------------------------------------- Matroska / WebM
+
+MKV_SEGMENT = 0x18538067
+MKV_SEEK_HEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMESTAMP_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_DEFAULT_DURATION = 0x23E383
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+
+def read_ebml_vint(reader, offset, keep_marker):
+    """Read an EBML variable length integer; returns (value, length, unknown_size)"""
+    first = reader.read(offset, 1)[0]
+    length = 1
+    mask = 0x80
+
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+
+    if length > 8:
+        raise ValueError("Invalid EBML variable length integer")
+
+    data = reader.read(offset, length)
+    value = int.from_bytes(data, 'big')
+
+    if keep_marker:
+        return value, length, False
+
+    value &= (1 << (7 * length)) - 1
+    return value, length, value == (1 << (7 * length)) - 1
+
+def iter_ebml_elements(reader, start, end):
+    """Yield (id, payload_offset, payload_size) for elements between start and end"""
+    offset = start
+
+    while offset < end:
+        element_id, id_length, _ = read_ebml_vint(reader, offset, True)
+        size, size_length, unknown = read_ebml_vint(reader, offset + id_length, False)
+        payload = offset + id_length + size_length
+
+        if unknown:
+            size = end - payload
+
+        yield element_id, payload, size
+        offset = payload + size
+
+def read_ebml_uint(reader, offset, size):
+    return int.from_bytes(reader.read(offset, size), 'big')
+
+def read_ebml_float(reader, offset, size):
+    return struct.unpack('>f' if size == 4 else '>d', reader.read(offset, size))[0]
+
+def probe_matroska(reader):
+    metadata = {'container': 'matroska'}
+
+    for element_id, offset, size in iter_ebml_elements(reader, 0, reader.size):
+        if element_id == MKV_SEGMENT:
+            parse_matroska_segment(reader, offset, min(offset + size, reader.size), metadata)
+            break
+
+    return metadata
+
+def parse_matroska_segment(reader, start, end, metadata):
+    found = set()
+    seek_positions = {}
+
+    for element_id, offset, size in iter_ebml_elements(reader, start, end):
+        if element_id == MKV_SEEK_HEAD:
+            seek_positions.update(parse_matroska_seek_head(reader, offset, size))
+        elif element_id == MKV_INFO:
+            parse_matroska_info(reader, offset, size, metadata)
+            found.add(MKV_INFO)
+        elif element_id == MKV_TRACKS:
+            parse_matroska_tracks(reader, offset, size, metadata)
+            found.add(MKV_TRACKS)
+        elif element_id == MKV_CLUSTER:
+            # Media data from here on; anything still missing is located via the SeekHead
+            break
+
+        if found == {MKV_INFO, MKV_TRACKS}:
+            return
+
+    for element_id, parse in ((MKV_INFO, parse_matroska_info), (MKV_TRACKS, parse_matroska_tracks)):
+        if element_id not in found and element_id in seek_positions:
+            position = start + seek_positions[element_id]
+            for child_id, offset, size in iter_ebml_elements(reader, position, end):
+                if child_id == element_id:
+                    parse(reader, offset, size, metadata)
+                break
+
+def parse_matroska_seek_head(reader, start, size):
+    positions = {}
+
+    for element_id, offset, seek_size in iter_ebml_elements(reader, start, start + size):
+        if element_id != MKV_SEEK:
+            continue
+
+        seek_id = position = None
+        for child_id, child_offset, child_size in iter_ebml_elements(reader, offset, offset + seek_size):
+            if child_id == MKV_SEEK_ID:
+                seek_id = read_ebml_uint(reader, child_offset, child_size)
+            elif child_id == MKV_SEEK_POSITION:
+                position = read_ebml_uint(reader, child_offset, child_size)
+
+        if seek_id is not None and position is not None:
+            positions[seek_id] = position
+
+    return positions
+
+def parse_matroska_info(reader, start, size, metadata):
+    timestamp_scale = 1000000
+    duration = None
+
+    for element_id, offset, child_size in iter_ebml_elements(reader, start, start + size):
+        if element_id == MKV_TIMESTAMP_SCALE:
+            timestamp_scale = read_ebml_uint(reader, offset, child_size)
+        elif element_id == MKV_DURATION:
+            duration = read_ebml_float(reader, offset, child_size)
+
+    if duration:
+        metadata['duration_seconds'] = round(duration * timestamp_scale / 1e9, 3)
+
+def parse_matroska_tracks(reader, start, size, metadata):
+    for element_id, offset, entry_size in iter_ebml_elements(reader, start, start + size):
+        if element_id != MKV_TRACK_ENTRY:
+            continue
+
+        track = {}
+        for child_id, child_offset, child_size in iter_ebml_elements(reader, offset, offset + entry_size):
+            if child_id == MKV_TRACK_TYPE:
+                track['type'] = read_ebml_uint(reader, child_offset, child_size)
+            elif child_id == MKV_CODEC_ID:
+                track['codec'] = reader.read(child_offset, child_size).rstrip(b'\x00').decode('ascii', 'replace')
+            elif child_id == MKV_DEFAULT_DURATION:
+                track['default_duration'] = read_ebml_uint(reader, child_offset, child_size)
+            elif child_id == MKV_VIDEO:
+                for video_id, video_offset, video_size in iter_ebml_elements(reader, child_offset, child_offset + child_size):
+                    if video_id == MKV_PIXEL_WIDTH:
+                        track['width'] = read_ebml_uint(reader, video_offset, video_size)
+                    elif video_id == MKV_PIXEL_HEIGHT:
+                        track['height'] = read_ebml_uint(reader, video_offset, video_size)
+
+        # Track type 1 is video; the first one describes the picture
+        if track.get('type') == 1:
+            metadata['codec'] = track.get('codec')
+            metadata['width'] = track.get('width')
+            metadata['height'] = track.get('height')
+            if track.get('default_duration'):
+                metadata['frame_rate'] = round(1e9 / track['default_duration'], 3)
+            return
@@ -1,12 +1,19 @@
 import json
 import boto3
 import os
+import time
 import uuid
 from urllib.parse import unquote_plus
 
+from video_probe import probe_s3_object
+
 rekognition = boto3.client('rekognition')
+s3 = boto3.client('s3')
 sns = boto3.client('sns')
 
+# Closest index matches checked for a matching duration and successful jobs
+MAX_DUPLICATE_CANDIDATES = 5
+
 def lambda_handler(event, context):
     """
     Lambda function triggered by S3 upload to start Rekognition video analysis
@@ -20,6 +27,26 @@ def lambda_handler(event, context):
             
             print(f"Processing video: {key} from bucket: {bucket}")
             
+            # Skip Rekognition entirely for near-duplicates of an analyzed video
+            fingerprint, duration, duplicate = find_duplicate(bucket, key, context)
+            
+            if duplicate:
+                distance, entry = duplicate
+                print(f"Reusing analysis of {entry['video_key']} (distance {distance})")
+                
+                sns.publish(
+                    TopicArn=os.environ['THREAT_ALERT_TOPIC'],
+                    Subject=f"Video Processing Reused: {key}",
+                    Message=json.dumps({
+                        'status': 'PROCESSING_REUSED',
+                        'video': key,
+                        'duplicate_of': entry['video_key'],
+                        'distance': distance,
+                        'jobs': entry['jobs']
+                    })
+                )
+                continue
+            
             # Generate unique job ID
             job_id_prefix = str(uuid.uuid4())
             
@@ -86,6 +113,9 @@ def lambda_handler(event, context):
                 'job_prefix': job_id_prefix
             }
             
+            if fingerprint is not None:
+                record_fingerprint(fingerprint, key, duration, job_metadata)
+            
             # Send initial processing notification
             sns.publish(
                 TopicArn=os.environ['THREAT_ALERT_TOPIC'],
@@ -110,3 +140,111 @@ def lambda_handler(event, context):
         'statusCode': 200,
         'body': json.dumps('Video processing jobs started successfully')
     }
+
+def find_duplicate(bucket, key, context):
+    """
+    Fingerprint the upload and look it up in the fingerprint index.
+    
+    Returns (fingerprint, duration, (distance, entry)) for the closest prior
+    analysis within DUPLICATE_MAX_DISTANCE whose duration matches and whose
+    jobs all succeeded, or (fingerprint, duration, None) when there is none.
+    The check gets a time budget that leaves enough of the invocation to start
+    the Rekognition jobs; any failure, including running out of budget or
+    numpy/ffmpeg being unavailable, falls back to a full analysis.
+    """
+    try:
+        # Imported here so a missing numpy only disables duplicate detection
+        from video_fingerprint import (
+            DEFAULT_MAX_DISTANCE,
+            durations_match,
+            fingerprint_video,
+            get_ffmpeg_path,
+            get_index,
+            load_entry
+        )
+        
+        # Off unless FFMPEG_PATH is configured; don't pay for any S3 calls then
+        if not get_ffmpeg_path():
+            return None, None, None
+        
+        reserve = float(os.environ.get('JOB_START_RESERVE_SECONDS', '60'))
+        budget = min(
+            float(os.environ.get('FINGERPRINT_BUDGET_SECONDS', '60')),
+            context.get_remaining_time_in_millis() / 1000 - reserve
+        )
+        
+        if budget <= 0:
+            print("Not enough time left for a duplicate check")
+            return None, None, None
+        
+        deadline = time.monotonic() + budget
+        
+        file_info = s3.head_object(Bucket=bucket, Key=key)
+        metadata = probe_s3_object(s3, bucket, key, file_info['ContentLength'], file_info.get('ETag'))
+        
+        if not metadata or not metadata.get('duration_seconds'):
+            print("No duration available, skipping duplicate check")
+            return None, None, None
+        
+        duration = metadata['duration_seconds']
+        video_url = s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=300
+        )
+        
+        fingerprint = fingerprint_video(video_url, duration, deadline)
+        if fingerprint is None:
+            return None, None, None
+        
+        if time.monotonic() > deadline:
+            print("Duplicate check over budget, skipping index lookup")
+            return fingerprint, duration, None
+        
+        results_bucket = os.environ['RESULTS_BUCKET']
+        max_distance = int(os.environ.get('DUPLICATE_MAX_DISTANCE', str(DEFAULT_MAX_DISTANCE)))
+        matches = get_index(s3, results_bucket).search(fingerprint, max_distance)
+        
+        for distance, entry_key in matches[:MAX_DUPLICATE_CANDIDATES]:
+            entry = load_entry(s3, results_bucket, entry_key)
+            
+            # A short clip from the same fixed camera can look alike; only reuse a same-length video
+            if not entry.get('duration_seconds') or not durations_match(duration, entry['duration_seconds']):
+                continue
+            
+            if not jobs_succeeded(results_bucket, entry['jobs']):
+                print(f"Jobs for {entry['video_key']} have not all succeeded, not reusing them")
+                continue
+            
+            return fingerprint, duration, (distance, entry)
+        
+        return fingerprint, duration, None
+        
+    except Exception as e:
+        print(f"Error checking for duplicate video: {str(e)}")
+        return None, None, None
+
+def jobs_succeeded(bucket, job_metadata):
+    """Check the job status results_processor records for each Rekognition job of an analysis"""
+    for job_field in ('label_job_id', 'moderation_job_id', 'person_job_id'):
+        try:
+            response = s3.get_object(Bucket=bucket, Key=f"job-status/{job_metadata[job_field]}.json")
+        except s3.exceptions.NoSuchKey:
+            # Still running, or its completion was never processed
+            return False
+        
+        if json.loads(response['Body'].read()).get('status') != 'SUCCEEDED':
+            return False
+    
+    return True
+
+def record_fingerprint(fingerprint, key, duration, job_metadata):
+    """Add an analyzed video to the fingerprint index"""
+    try:
+        from video_fingerprint import save_entry
+        
+        entry_key = save_entry(s3, os.environ['RESULTS_BUCKET'], fingerprint, key, duration, job_metadata)
+        print(f"Recorded fingerprint for {key} at {entry_key}")
+        
+    except Exception as e:
+        print(f"Error recording fingerprint: {str(e)}")
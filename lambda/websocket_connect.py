@@ -2,13 +2,18 @@ import json
 import boto3
 import os
 
+from rolling_aggregates import evict_expired, load_snapshot
+
 dynamodb = boto3.resource('dynamodb')
 
 def lambda_handler(event, context):
     """
-    Handle WebSocket connection
+    Handle WebSocket connection and snapshot requests
     """
     
+    if event['requestContext'].get('routeKey') == 'snapshot':
+        return send_snapshot(event)
+    
     try:
         connection_id = event['requestContext']['connectionId']
         
@@ -35,3 +40,48 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps(f'Error: {str(e)}')
         }
+
+def send_snapshot(event):
+    """
+    Push the rolling aggregate snapshot to a newly connected client.
+
+    API Gateway does not allow posting to a connection until $connect has
+    returned, so the dashboard asks for the snapshot as its first message.
+    """
+    
+    try:
+        request_context = event['requestContext']
+        connection_id = request_context['connectionId']
+        
+        snapshot, version = load_snapshot(dynamodb.Table(os.environ['AGGREGATES_TABLE']))
+        
+        # The stored item is only trimmed when a result arrives; trim this copy to now
+        snapshot = evict_expired(snapshot)
+        
+        apigateway = boto3.client(
+            'apigatewaymanagementapi',
+            endpoint_url=f"https://{request_context['domainName']}/{request_context['stage']}"
+        )
+        
+        apigateway.post_to_connection(
+            ConnectionId=connection_id,
+            Data=json.dumps({
+                'action': 'aggregate_snapshot',
+                'version': version,
+                'snapshot': snapshot
+            })
+        )
+        
+        print(f"✅ Sent aggregate snapshot v{version} to {connection_id}")
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps('Snapshot sent')
+        }
+        
+    except Exception as e:
+        print(f"❌ Error sending snapshot: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error: {str(e)}')
+        }
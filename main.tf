@@ -1,5 +1,5 @@
 terraform {
-  required_version = ">= 1.0"
+  required_version = ">= 1.4"
   required_providers {
     aws = {
       source  = "hashicorp/aws"
@@ -140,11 +140,27 @@ resource "aws_sns_topic" "completion" {
   }
 }
 
+# Results records that keep failing end up here instead of looping for the whole retention period
+resource "aws_sqs_queue" "results_dlq" {
+  name                      = "vdt-queue-dlq-${random_string.deployment_id.result}"
+  message_retention_seconds = 1209600
+  
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
 resource "aws_sqs_queue" "results_queue" {
   name                      = "vdt-queue-${random_string.deployment_id.result}"
   visibility_timeout_seconds = 300
   message_retention_seconds = 1209600
   
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.results_dlq.arn
+    maxReceiveCount     = 5
+  })
+  
   tags = {
     Environment = var.environment
     Project     = var.project_name
@@ -227,6 +243,13 @@ resource "aws_iam_policy" "lambda_video_policy" {
           "${aws_s3_bucket.analysis_results.arn}/*"
         ]
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = aws_s3_bucket.analysis_results.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -308,7 +331,8 @@ resource "aws_iam_policy" "lambda_results_policy" {
         Action = [
           "sqs:ReceiveMessage",
           "sqs:DeleteMessage",
-          "sqs:GetQueueAttributes"
+          "sqs:GetQueueAttributes",
+          "sqs:SendMessage"
         ]
         Resource = aws_sqs_queue.results_queue.arn
       },
@@ -322,7 +346,9 @@ resource "aws_iam_policy" "lambda_results_policy" {
       {
         Effect = "Allow"
         Action = [
-          "s3:PutObject"
+          "s3:PutObject",
+          "s3:GetObject",
+          "s3:DeleteObject"
         ]
         Resource = "${aws_s3_bucket.analysis_results.arn}/*"
       },
@@ -484,6 +510,13 @@ resource "aws_iam_policy" "websocket_lambda_policy" {
         ]
         Resource = aws_dynamodb_table.websocket_connections.arn
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem"
+        ]
+        Resource = aws_dynamodb_table.dashboard_aggregates.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -570,6 +603,14 @@ resource "aws_iam_role_policy" "lambda_analysis_policy" {
           "dynamodb:DeleteItem"
         ]
         Resource = aws_dynamodb_table.websocket_connections.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ]
+        Resource = aws_dynamodb_table.dashboard_aggregates.arn
       }
     ]
   })
@@ -586,6 +627,36 @@ data "archive_file" "lambda_zip" {
   output_path = "${path.module}/lambda_functions.zip"
 }
 
+# Third-party packages from lambda/requirements.txt (numpy), built for the Lambda runtime.
+# lambda_layer/ is gitignored, so a checkout without it gets a fresh build id and rebuilds;
+# the build writes that id to .build-id, which keeps the next plan unchanged.
+resource "terraform_data" "lambda_dependencies" {
+  triggers_replace = [
+    filesha256("${path.module}/lambda/requirements.txt"),
+    fileexists("${path.module}/lambda_layer/.build-id") ? trimspace(file("${path.module}/lambda_layer/.build-id")) : uuid()
+  ]
+
+  provisioner "local-exec" {
+    command = "rm -rf ${path.module}/lambda_layer && pip install -r ${path.module}/lambda/requirements.txt -t ${path.module}/lambda_layer/python --platform manylinux2014_x86_64 --implementation cp --python-version 3.9 --only-binary=:all: && printf '%s' '${self.triggers_replace[1]}' > ${path.module}/lambda_layer/.build-id"
+  }
+}
+
+data "archive_file" "lambda_layer_zip" {
+  type        = "zip"
+  source_dir  = "${path.module}/lambda_layer"
+  output_path = "${path.module}/lambda_layer.zip"
+  excludes    = [".build-id"]
+
+  depends_on = [terraform_data.lambda_dependencies]
+}
+
+resource "aws_lambda_layer_version" "python_dependencies" {
+  filename            = data.archive_file.lambda_layer_zip.output_path
+  layer_name          = "vdt-python-dependencies-${random_string.deployment_id.result}"
+  compatible_runtimes = ["python3.9"]
+  source_code_hash    = data.archive_file.lambda_layer_zip.output_base64sha256
+}
+
 resource "aws_lambda_function" "video_processor" {
   filename         = data.archive_file.lambda_zip.output_path
   function_name    = "vdt-video-processor-${random_string.deployment_id.result}"
@@ -593,6 +664,7 @@ resource "aws_lambda_function" "video_processor" {
   handler         = "video_processor.lambda_handler"
   runtime         = "python3.9"
   timeout         = 300
+  layers          = compact([aws_lambda_layer_version.python_dependencies.arn, var.ffmpeg_layer_arn])
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
 
   environment {
@@ -603,6 +675,7 @@ resource "aws_lambda_function" "video_processor" {
       THREAT_ALERT_TOPIC = aws_sns_topic.alerts.arn
       MIN_CONFIDENCE = var.min_confidence_threshold
       WEBSOCKET_API_ENDPOINT = aws_apigatewayv2_stage.websocket_stage.invoke_url
+      FFMPEG_PATH = var.ffmpeg_layer_arn != "" ? "/opt/bin/ffmpeg" : ""
     }
   }
 }
@@ -614,6 +687,7 @@ resource "aws_lambda_function" "results_processor" {
   handler         = "results_processor.lambda_handler"
   runtime         = "python3.9"
   timeout         = 300
+  layers          = [aws_lambda_layer_version.python_dependencies.arn]
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
 
   environment {
@@ -623,6 +697,7 @@ resource "aws_lambda_function" "results_processor" {
       MIN_CONFIDENCE = var.min_confidence_threshold
       WEBSOCKET_API_ENDPOINT = aws_apigatewayv2_stage.websocket_stage.invoke_url
       CONNECTIONS_TABLE = aws_dynamodb_table.websocket_connections.name
+      RESULTS_QUEUE_URL = aws_sqs_queue.results_queue.url
     }
   }
 }
@@ -659,6 +734,7 @@ resource "aws_lambda_function" "threat_analyzer" {
     variables = {
       WEBSOCKET_API_ENDPOINT = aws_apigatewayv2_stage.websocket_stage.invoke_url
       CONNECTIONS_TABLE      = aws_dynamodb_table.websocket_connections.name
+      AGGREGATES_TABLE       = aws_dynamodb_table.dashboard_aggregates.name
     }
   }
 }
@@ -676,6 +752,7 @@ resource "aws_lambda_function" "websocket_connect" {
   environment {
     variables = {
       CONNECTIONS_TABLE = aws_dynamodb_table.websocket_connections.name
+      AGGREGATES_TABLE  = aws_dynamodb_table.dashboard_aggregates.name
     }
   }
 }
@@ -893,6 +970,18 @@ resource "aws_dynamodb_table" "websocket_connections" {
   }
 }
 
+# DynamoDB table for the rolling dashboard aggregate snapshot
+resource "aws_dynamodb_table" "dashboard_aggregates" {
+  name         = "vdt-aggregates-${random_string.deployment_id.result}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "aggregateId"
+
+  attribute {
+    name = "aggregateId"
+    type = "S"
+  }
+}
+
 # WebSocket Routes
 resource "aws_apigatewayv2_route" "websocket_connect_route" {
   api_id    = aws_apigatewayv2_api.websocket_api.id
@@ -906,6 +995,12 @@ resource "aws_apigatewayv2_route" "websocket_disconnect_route" {
   target    = "integrations/${aws_apigatewayv2_integration.websocket_disconnect_integration.id}"
 }
 
+resource "aws_apigatewayv2_route" "websocket_snapshot_route" {
+  api_id    = aws_apigatewayv2_api.websocket_api.id
+  route_key = "snapshot"
+  target    = "integrations/${aws_apigatewayv2_integration.websocket_connect_integration.id}"
+}
+
 # WebSocket Integrations
 resource "aws_apigatewayv2_integration" "websocket_connect_integration" {
   api_id           = aws_apigatewayv2_api.websocket_api.id
@@ -944,6 +1039,9 @@ resource "aws_lambda_event_source_mapping" "sqs_to_results_processor" {
   event_source_arn = aws_sqs_queue.results_queue.arn
   function_name    = aws_lambda_function.results_processor.arn
   batch_size       = 10
+
+  # results_processor reports failed records individually so the rest of the batch isn't redelivered
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_lambda_permission" "s3_invoke_video_processor" {
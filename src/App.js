@@ -14,6 +14,7 @@ function App() {
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [connectionStatus, setConnectionStatus] = useState('disconnected');
   const [notifications, setNotifications] = useState([]);
+  const [aggregates, setAggregates] = useState(null);
   const wsManagerRef = useRef(null);
 
   useEffect(() => {
@@ -63,6 +64,11 @@ function App() {
       }
     };
 
+    wsManagerRef.current.onSnapshot = (snapshot) => {
+      console.log('Aggregate snapshot:', snapshot);
+      setAggregates(snapshot);
+    };
+
     wsManagerRef.current.connect();
 
     return () => {
@@ -135,6 +141,7 @@ function App() {
             <div className="dashboard-section">
               <ThreatDashboard
                 analysisResults={analysisResults}
+                aggregates={aggregates}
                 isAnalyzing={isAnalyzing}
                 onClearResults={clearResults}
               />
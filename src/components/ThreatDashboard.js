@@ -1,7 +1,7 @@
 import React from 'react';
 
 
-const ThreatDashboard = ({ analysisResults, isAnalyzing, onClearResults }) => {
+const ThreatDashboard = ({ analysisResults, aggregates, isAnalyzing, onClearResults }) => {
   const threats = analysisResults.flatMap(result => result.threats || []);
   const totalThreats = threats.length;
   const uniqueTypes = [...new Set(threats.map(t => t.type))].length;
@@ -59,6 +59,30 @@ const ThreatDashboard = ({ analysisResults, isAnalyzing, onClearResults }) => {
         )}
       </div>
 
+      {/* Rolling aggregates from the last hour, sent on connect and with every result */}
+      {aggregates && aggregates.top_threats && aggregates.top_threats.length > 0 && (
+        <div style={{ 
+          background: 'rgba(51, 65, 85, 0.5)', 
+          padding: '15px', 
+          borderRadius: '8px',
+          marginBottom: '20px'
+        }}>
+          <h3 style={{ marginTop: 0 }}>🕐 Last {aggregates.window_minutes} Minutes</h3>
+          <div style={{ display: 'flex', gap: '1rem', flexWrap: 'wrap', marginBottom: '10px' }}>
+            {Object.entries(aggregates.totals.severity).map(([severity, count]) => (
+              <span key={severity} style={{ padding: '0.25rem 0.5rem', backgroundColor: 'rgba(59, 130, 246, 0.3)', borderRadius: '4px', fontSize: '0.75rem' }}>
+                {severity}: {count}
+              </span>
+            ))}
+          </div>
+          {aggregates.top_threats.map((threat, index) => (
+            <div key={index} style={{ fontSize: '0.875rem', color: '#cbd5e1' }}>
+              {threat.severity} · {threat.type} ({Math.round(threat.confidence)}%) — {threat.video_key}
+            </div>
+          ))}
+        </div>
+      )}
+
       {analysisResults.length === 0 ? (
         <div style={{ textAlign: 'center', padding: '40px' }}>
           <div style={{ fontSize: '3rem', marginBottom: '1rem' }}>🛡️</div>
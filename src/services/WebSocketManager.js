@@ -9,6 +9,7 @@ class WebSocketManager {
     this.onConnectionChange = null;
     this.onThreatDetected = null;
     this.onProcessingUpdate = null;
+    this.onSnapshot = null;
   }
 
   connect() {
@@ -22,6 +23,9 @@ class WebSocketManager {
         if (this.onConnectionChange) {
           this.onConnectionChange('connected');
         }
+        
+        // Ask for the rolling aggregate snapshot so the dashboard loads immediately
+        this.send({ action: 'snapshot' });
       };
 
       this.ws.onmessage = (event) => {
@@ -41,6 +45,11 @@ class WebSocketManager {
               summary: data.summary
             });
             
+            // Results carry the updated rolling aggregates so the dashboard stays current
+            if (data.aggregates && this.onSnapshot) {
+              this.onSnapshot(data.aggregates);
+            }
+            
             // Treat as threat detection result (always call this for analysis results)
             if (this.onThreatDetected) {
               console.log('📞 Calling onThreatDetected callback');
@@ -57,6 +66,13 @@ class WebSocketManager {
               });
             }
           }
+          // Handle rolling aggregate snapshot sent after connecting
+          else if (data.action === 'aggregate_snapshot') {
+            console.log('📊 Aggregate snapshot received, version:', data.version);
+            if (this.onSnapshot) {
+              this.onSnapshot(data.snapshot);
+            }
+          }
           // Handle legacy threat detection format
           else if (data.alert_type === 'THREAT_DETECTED' && this.onThreatDetected) {
             console.log('🚨 Legacy threat detected message');
@@ -27,3 +27,9 @@ variable "notification_email" {
   type        = string
   default     = ""
 }
+
+variable "ffmpeg_layer_arn" {
+  description = "ARN of a Lambda layer with a static ffmpeg at /opt/bin/ffmpeg; enables near-duplicate upload detection in video_processor. Leave empty to keep it off"
+  type        = string
+  default     = ""
+}